@@ -3,53 +3,72 @@ Athlete Dashboard Application
 
 This script creates a Dash web application for visualizing athlete data based on age group and year.
 It includes a dropdown to filter by year and age group, a bar chart, and a data table.
+The table is filtered clientside on a copy of the dataset stored in the browser.
 """
 
 import pandas as pd
+import numpy as np
+import pyarrow as pa
 import dash
 from dash import Dash, Input, Output, dcc, html, dash_table
 import warnings
 import sqlite3
+import os
 
 # Ignore future warnings
 warnings.simplefilter(action="ignore", category=FutureWarning)
 import plotly.express as px
 
 
-# Load the dataset
-conn = sqlite3.connect("../webparser/runners_db.db")
-df = pd.read_sql_query("SELECT * FROM runners", conn)
-conn.close()
-
-
-def set_age_group(age):
-    """
-    Categorize athletes into age groups based on their age.
-
-    Args:
-        age (int): The age of the athlete.
-
-    Returns:
-        str: The age group the athlete falls into.
-    """
-    if age <= 20:
-        return "0-20"
-    elif 20 < age <= 30:
-        return "20-30"
-    elif 30 < age <= 40:
-        return "30-40"
-    elif 40 < age <= 50:
-        return "40-50"
-    else:
-        return "50+"
-
-
-# Calculate the age and age group for each athlete
-df["age"] = df["run_year"] - df["Age_year"]
-df["age_group"] = df["age"].apply(set_age_group)
-
-# Aggregate data for the bar chart
-df2 = df.groupby(["run_year", "age_group"]).size().reset_index(name="Count athletes")
+# Load the dataset, preferring the Parquet cache unless the database is newer
+parquet_path = "../webparser/runners.parquet"
+db_path = "../webparser/runners_db.db"
+if os.path.exists(parquet_path) and (
+    not os.path.exists(db_path)
+    or os.path.getmtime(parquet_path) >= os.path.getmtime(db_path)
+):
+    df = pd.read_parquet(parquet_path)
+    df["age"] = df["run_year"] - df["Age_year"]
+else:
+    conn = sqlite3.connect(db_path)
+    df = pd.read_sql_query(
+        """
+        SELECT Category, Rang, Fullname, Age_year, Location, total_time, run_link,
+               run_year, (run_year - Age_year) AS age
+        FROM runners
+        WHERE Age_year IS NOT NULL AND run_year > Age_year
+        """,
+        conn,
+    )
+    conn.close()
+
+# Calculate the age group for each athlete
+df["run_year"] = df["run_year"].astype("int32")
+age_bins = np.array([20, 30, 40, 50], dtype=np.int32)
+age_labels = ["0-20", "20-30", "30-40", "40-50", "50+"]
+age_codes = np.digitize(df["age"].to_numpy(np.int32), age_bins, right=True)
+df["age_group"] = pd.Categorical.from_codes(age_codes, categories=age_labels)
+
+# Store the low-cardinality category column as categorical
+df["Category"] = df["Category"].astype("category")
+
+# Aggregate data for the bar chart once; at most one row per (year, age group)
+df2 = (
+    df.groupby(["run_year", "age_group"], sort=False, observed=True)
+    .size()
+    .reset_index(name="Count athletes")
+)
+# Sort the few aggregated rows afterwards to keep a stable chart ordering
+df2.sort_values(["run_year", "age_group"], inplace=True)
+
+# Bar chart of the unfiltered dataset
+DEFAULT_FIG = px.bar(
+    df2,
+    x="run_year",
+    y="Count athletes",
+    color="age_group",
+    title="Athletes per Age Group",
+)
 
 # Columns to display in the data table
 columns_to_display = [
@@ -63,6 +82,9 @@ columns_to_display = [
     "run_year",
 ]
 
+# Table records of the unfiltered dataset, converted by Arrow instead of row by row
+records = pa.Table.from_pandas(df, preserve_index=False).to_pylist()
+
 # Initialize the Dash app
 app = Dash(__name__)
 
@@ -101,11 +123,12 @@ app.layout = html.Div(
         ),
         # Bar chart to display athletes per age group
         dcc.Graph(id="bar-chart"),
+        # Full dataset shipped once to the browser for clientside table filtering
+        dcc.Store(id="all-records", data=records),
         # Data table to display filtered results
         dash_table.DataTable(
             id="table-data",
             columns=[{"name": col, "id": col} for col in columns_to_display],
-            data=df.to_dict("records"),
             style_table={"overflowX": "scroll"},
             css=[{"selector": "tr:first-child", "rule": "display: none"}],
         ),
@@ -115,39 +138,61 @@ app.layout = html.Div(
 )
 
 
+# Filter the table in the browser so the records are not re-sent on every selection
+app.clientside_callback(
+    """
+    function(selectedYears, selectedAgeGroups, allRecords) {
+        const byYear = selectedYears && selectedYears.length > 0;
+        const byAgeGroup = selectedAgeGroups && selectedAgeGroups.length > 0;
+        if (!byYear && !byAgeGroup) {
+            return allRecords;
+        }
+        return allRecords.filter(
+            (record) =>
+                (!byYear || selectedYears.includes(String(record.run_year))) &&
+                (!byAgeGroup || selectedAgeGroups.includes(record.age_group))
+        );
+    }
+    """,
+    Output("table-data", "data"),
+    [
+        Input("year-dropdown", "value"),
+        Input("age-dropdown", "value"),
+        Input("all-records", "data"),
+    ],
+)
+
+
 @app.callback(
-    [Output("bar-chart", "figure"), Output("table-data", "data")],
+    Output("bar-chart", "figure"),
     [Input("year-dropdown", "value"), Input("age-dropdown", "value")],
 )
-def update_chart_and_table(selected_years, selected_age_groups):
+def update_chart(selected_years, selected_age_groups):
     """
-    Update both the bar chart and the filtered data table based on selected year(s) and age group(s).
+    Update the bar chart based on selected year(s) and age group(s).
 
     Args:
         selected_years (list): List of selected years.
         selected_age_groups (list): List of selected age groups.
 
     Returns:
-        tuple: A Plotly bar chart and a filtered table in dictionary format.
+        plotly.graph_objects.Figure: A Plotly bar chart of the filtered data.
     """
-    # Make copies of the data for filtering
-    filtered_data = df.copy()
-    filtered_bar_data = df2.copy()
+    # Reuse the precomputed chart when no filter is applied
+    if not selected_years and not selected_age_groups:
+        return DEFAULT_FIG
+
+    filtered_bar_data = df2
 
     # Filter by selected years
     if selected_years:
-        filtered_data = filtered_data[
-            filtered_data["run_year"].astype(str).isin(selected_years)
-        ]
+        years = [int(year) for year in selected_years]
         filtered_bar_data = filtered_bar_data[
-            filtered_bar_data["run_year"].astype(str).isin(selected_years)
+            filtered_bar_data["run_year"].isin(years)
         ]
 
     # Filter by selected age groups
     if selected_age_groups:
-        filtered_data = filtered_data[
-            filtered_data["age_group"].isin(selected_age_groups)
-        ]
         filtered_bar_data = filtered_bar_data[
             filtered_bar_data["age_group"].isin(selected_age_groups)
         ]
@@ -161,8 +206,7 @@ def update_chart_and_table(selected_years, selected_age_groups):
         title="Athletes per Age Group",
     )
 
-    # Return the bar chart and the filtered table data
-    return bar_chart, filtered_data.to_dict("records")
+    return bar_chart
 
 
 if __name__ == "__main__":
@@ -1,92 +1,216 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from selectolax.lexbor import LexborHTMLParser
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import string
 import re
 import sqlite3
+import argparse
+import os
+
+# Columns of the runners' data
+COLUMNS = [
+    "Category",
+    "Rang",
+    "Fullname",
+    "Age_year",
+    "Location",
+    "total_time",
+    "run_link",
+    "run_year",
+]
+
+# Number of pages fetched concurrently
+MAX_WORKERS = 16
+
+# Pattern of a single runner entry on a results page
+RUNNER_RE = re.compile(
+    r"(?P<Category>[^ ]+) +(?P<Rang>\d+|DNF|DSQ|OUT)\.? +(?P<Fullname>[^\d]+?) +(?P<Age_year>\d{4}|\?{4}) +"
+    r"(?P<Location>.*?) +(?P<total_time>[\d:.,]+)? +.*?[^ ] +\(\d+\)"
+)
+
+
+def fetch_page(session, year, url):
+    """
+    Fetch a single results page.
+
+    Args:
+        session (requests.Session): The session used to issue the request.
+        year (str): The marathon year the page belongs to.
+        url (str): The URL of the page.
+
+    Returns:
+        tuple: The year, URL and HTML content of the page, or None if the request failed.
+    """
+    try:
+        # Try making a GET request to the URL
+        page = session.get(url, timeout=10)
+        page.raise_for_status()  # Raise HTTPError for bad responses (4xx, 5xx)
+    except requests.exceptions.HTTPError as http_err:
+        print(f"HTTP error occurred: {http_err} - URL: {url}")
+        return None  # Skip the URL in case of HTTP errors
+    except requests.exceptions.ConnectionError as conn_err:
+        print(f"Connection error occurred: {conn_err} - URL: {url}")
+        return None  # Skip the URL in case of connection errors
+    except requests.exceptions.Timeout as timeout_err:
+        print(f"Timeout error occurred: {timeout_err} - URL: {url}")
+        return None  # Skip the URL in case of timeouts
+    except requests.exceptions.RequestException as req_err:
+        print(f"General error occurred: {req_err} - URL: {url}")
+        return None  # Skip the URL in case of any other request exceptions
+
+    return year, url, page.text
+
+
+def iter_runners(years):
+    """
+    Scrape the results pages of the given years and yield one entry per runner.
+
+    Args:
+        years (list): list of years to parse for.
+
+    Yields:
+        tuple: The runner's category, rang, full name, birth year (None if unknown), location,
+        total time, results page URL and run year, in the order of COLUMNS.
+    """
+    letters = list(string.ascii_lowercase)
+
+    urls = [
+        (year, f"https://services.datasport.com/{year}/lauf/zuerich/alfa{letter}.htm")
+        for year in years
+        for letter in letters
+    ]
+
+    # Reuse connections across requests and fetch the pages concurrently
+    with requests.Session() as session:
+        adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+        session.mount("https://", adapter)
+
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            pages = executor.map(lambda item: fetch_page(session, *item), urls)
+
+            for result in pages:
+                if result is None:
+                    continue
+                year, url, text = result
+
+                tree = LexborHTMLParser(text)
+                runners = [node.text() for node in tree.css('font[size="2"]')]
+
+                for runner in runners:
+                    match = RUNNER_RE.match(runner)
+                    if match is None:
+                        continue
+
+                    category, rang, fullname, age_year, location, total_time = (
+                        match.groups()
+                    )
+                    # Unknown birth years are given as "????"
+                    age_year = None if age_year == "????" else int(age_year)
+                    yield (
+                        category,
+                        rang,
+                        fullname,
+                        age_year,
+                        location,
+                        total_time,
+                        url,
+                        int(year),
+                    )
 
 
 def scrape_runners_data(years):
     """
-    Scrape runners' data from the given URLs, process it into a DataFrame, and clean the data.
+    Scrape runners' data from the given URLs and process it into a DataFrame.
 
     The function iterates over the provided years and letters to build URLs dynamically, fetches
-    the HTML content, and extracts runners' data. It organizes the data into a Pandas DataFrame,
-    processes the age and year values, and performs cleaning on the dataset.
+    the HTML content, and extracts runners' data. It organizes the data into a Pandas DataFrame
+    with typed columns.
 
     Args:
         years (list): list of years to parse for.
 
     Returns:
-        pd.DataFrame: A cleaned DataFrame with the runners' data.
-    """
-    columns = [
-        "Category",
-        "Rang",
-        "Fullname",
-        "Age_year",
-        "Location",
-        "total_time",
-        "run_link",
-        "run_year",
-    ]
-    df = pd.DataFrame(columns=columns)
-    letters = list(string.ascii_lowercase)
+        pd.DataFrame: A DataFrame with the runners' data.
+    """
+    # Transpose the runner entries into columns so the DataFrame can be built with typed arrays
+    (
+        categories,
+        rangs,
+        fullnames,
+        age_years,
+        locations,
+        total_times,
+        run_links,
+        run_years,
+    ) = list(zip(*iter_runners(years))) or [()] * len(COLUMNS)
+
+    # Build the DataFrame once from typed column arrays
+    df = pd.DataFrame(
+        {
+            "Category": pd.array(categories, dtype="string"),
+            "Rang": pd.array(rangs, dtype="string"),
+            "Fullname": pd.array(fullnames, dtype="string"),
+            "Age_year": pd.array(age_years, dtype="Int64"),
+            "Location": pd.array(locations, dtype="string"),
+            "total_time": pd.array(total_times, dtype="string"),
+            "run_link": pd.array(run_links, dtype="string"),
+            "run_year": np.asarray(run_years, dtype=np.int32),
+        }
+    )
 
-    for year in years:
-        for letter in letters:
-            url = f"https://services.datasport.com/{year}/lauf/zuerich/alfa{letter}.htm"
-            try:
-                # Try making a GET request to the URL
-                page = requests.get(url, timeout=10)
-                page.raise_for_status()  # Raise HTTPError for bad responses (4xx, 5xx)
-            except requests.exceptions.HTTPError as http_err:
-                print(f"HTTP error occurred: {http_err} - URL: {url}")
-                continue  # Skip to the next URL in case of HTTP errors
-            except requests.exceptions.ConnectionError as conn_err:
-                print(f"Connection error occurred: {conn_err} - URL: {url}")
-                continue  # Skip to the next URL in case of connection errors
-            except requests.exceptions.Timeout as timeout_err:
-                print(f"Timeout error occurred: {timeout_err} - URL: {url}")
-                continue  # Skip to the next URL in case of timeouts
-            except requests.exceptions.RequestException as req_err:
-                print(f"General error occurred: {req_err} - URL: {url}")
-                continue  # Skip to the next URL in case of any other request exceptions
-            soup = BeautifulSoup(page.text, "html.parser")
-            runners = [
-                data.get_text()
-                for data in soup.select("font")
-                if 'font size="2"' in str(data)
-            ]
-
-            for runner in runners:
-                try:
-                    row = re.match(
-                        r"(?P<Category>[^ ]+) +(?P<Rang>\d+|DNF|DSQ|OUT)\.? +(?P<Fullname>[^\d]+?) +(?P<Age_year>\d{4}|\?{4}) +"
-                        r"(?P<Location>.*?) +(?P<total_time>[\d:.,]+)? +.*?[^ ] +\(\d+\)",
-                        runner,
-                    ).groupdict()
-                except:
-                    continue
+    return df
 
-                new_row = pd.DataFrame(
-                    {
-                        "Category": row["Category"],
-                        "Rang": row["Rang"],
-                        "Fullname": row["Fullname"],
-                        "Age_year": row["Age_year"],
-                        "Location": row["Location"],
-                        "total_time": row["total_time"],
-                        "run_link": url,
-                        "run_year": int(year),
-                    },
-                    index=[0],
-                )
-
-                df = pd.concat([new_row, df.loc[:]]).reset_index(drop=True)
 
-    return df
+def scrape_runners_to_sqlite(years, db_name, table_name, batch_size=1000):
+    """
+    Scrape runners' data and stream the valid entries directly into an SQLite database.
+
+    Unlike scrape_runners_data, the runners are never collected into a DataFrame, so memory use
+    stays constant regardless of the number of years scraped. Entries are cleaned inline the
+    same way as in clean_runners_data, and the rows are numbered the same way as in
+    save_to_sqlite.
+
+    Args:
+        years (list): list of years to parse for.
+        db_name (str): The name of the SQLite database.
+        table_name (str): The name of the table in the SQLite database.
+        batch_size (int): The number of rows passed to each executemany call.
+    """
+    conn = sqlite3.connect(db_name)
+
+    # Create the table if it doesn't exist
+    create_runners_table(conn, table_name)
+
+    insert = (
+        f"INSERT INTO {table_name} (Id, {', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})"
+    )
+
+    # Replace the table contents in a single transaction, so a failed scrape keeps the old data
+    with conn:
+        conn.execute(f"DELETE FROM {table_name}")
+
+        batch = []
+        row_id = 0
+        for runner in iter_runners(years):
+            # Keep runners with a known birth year before the run year
+            age_year, run_year = runner[3], runner[7]
+            if age_year is None or run_year <= age_year:
+                continue
+
+            batch.append((row_id, *runner))
+            row_id += 1
+            if len(batch) >= batch_size:
+                conn.executemany(insert, batch)
+                batch = []
+
+        conn.executemany(insert, batch)
+        create_run_year_index(conn, table_name)
+    conn.close()
 
 
 def clean_runners_data(df):
@@ -97,18 +221,12 @@ def clean_runners_data(df):
         df (pd.DataFrame): The original DataFrame with runners' data.
 
     Returns:
-        pd.DataFrame: A cleaned DataFrame with valid age data and unnecessary columns removed.
+        pd.DataFrame: A cleaned DataFrame with valid age data.
     """
-    df["Age_year"] = pd.to_numeric(df["Age_year"], errors="coerce")
-    df["Age_year"] = df["Age_year"].astype("Int64")
-    df["run_year"] = df["run_year"].astype("Int64")
-
-    # Calculate runners' age and filter out invalid age entries
-    df["age"] = df["run_year"] - df["Age_year"]
-    df = df[df["age"].notna() & (df["age"] > 0)]
-
-    # Drop unnecessary columns and reset the index
-    df = df.drop(columns=["age"]).reset_index(drop=True)
+    # Keep runners with a known birth year before the run year
+    age_years = df["Age_year"].to_numpy(dtype="float64", na_value=np.nan)
+    run_years = df["run_year"].to_numpy()
+    df = df.loc[~np.isnan(age_years) & (run_years > age_years)]
 
     return df
 
@@ -124,18 +242,27 @@ def save_to_csv(df, filename):
     df.to_csv(filename, index=False)
 
 
-def save_to_sqlite(df, db_name, table_name):
+def save_to_parquet(df, filename):
     """
-    Save the cleaned DataFrame to an SQLite database.
+    Save the cleaned DataFrame to a Parquet file used as the dashboard's startup cache.
 
     Args:
         df (pd.DataFrame): The cleaned DataFrame with runners' data.
-        db_name (str): The name of the SQLite database.
-        table_name (str): The name of the table in the SQLite database.
+        filename (str): The name of the Parquet file.
     """
-    conn = sqlite3.connect(db_name)
+    # Store the category as categorical so it round-trips as integer codes
+    df = df.astype({"Category": "category"})
+    df.to_parquet(filename, index=False, compression="zstd")
 
-    # Create the table if it doesn't exist
+
+def create_runners_table(conn, table_name):
+    """
+    Create the runners table if it doesn't exist.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the SQLite database.
+        table_name (str): The name of the table in the SQLite database.
+    """
     conn.execute(
         f"""
         CREATE TABLE IF NOT EXISTS {table_name} (
@@ -152,8 +279,49 @@ def save_to_sqlite(df, db_name, table_name):
     """
     )
 
-    # Save the DataFrame to the SQLite table
-    df.to_sql(table_name, conn, if_exists="replace", index=True, index_label="Id")
+
+def create_run_year_index(conn, table_name):
+    """
+    Index the year column so queries can filter by year without a full scan.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the SQLite database.
+        table_name (str): The name of the table in the SQLite database.
+    """
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{table_name}_run_year ON {table_name}(run_year)"
+    )
+
+
+def save_to_sqlite(df, db_name, table_name):
+    """
+    Save the cleaned DataFrame to an SQLite database.
+
+    Args:
+        df (pd.DataFrame): The cleaned DataFrame with runners' data.
+        db_name (str): The name of the SQLite database.
+        table_name (str): The name of the table in the SQLite database.
+    """
+    conn = sqlite3.connect(db_name)
+
+    # Create the table if it doesn't exist
+    create_runners_table(conn, table_name)
+
+    # Replace the table contents and insert all rows in a single transaction
+    values = df[COLUMNS].astype(object)
+    values = values.where(values.notna(), None)  # Missing values are stored as NULL
+    with conn:
+        conn.execute(f"DELETE FROM {table_name}")
+        conn.executemany(
+            f"INSERT INTO {table_name} (Id, {', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+            # Number the rows 0..n-1 rather than storing the filtered index
+            (
+                (row_id, *row)
+                for row_id, row in enumerate(values.itertuples(index=False, name=None))
+            ),
+        )
+        create_run_year_index(conn, table_name)
     conn.close()
 
 
@@ -161,18 +329,41 @@ def main():
     """
     Main function to orchestrate the data scraping, cleaning, and saving processes.
 
-    It scrapes runners' data, cleans the dataset, and saves the results to both CSV and SQLite database.
+    It scrapes runners' data, cleans the dataset, and saves the results to CSV, SQLite database and Parquet.
+    With --sqlite-only, the runners are streamed straight into the SQLite database instead.
     """
+    arg_parser = argparse.ArgumentParser(
+        description="Scrape the Zurich marathon runners from Datasport."
+    )
+    arg_parser.add_argument(
+        "--sqlite-only",
+        action="store_true",
+        help="stream the runners into the SQLite database without building a DataFrame "
+        "(results.csv and runners.parquet are not written)",
+    )
+    args = arg_parser.parse_args()
+
     years = ["2014", "2015", "2016", "2017", "2018"]
+
+    if args.sqlite_only:
+        # Scrape, clean and save the data row by row
+        scrape_runners_to_sqlite(years, "runners_db.db", "runners")
+
+        # Remove the Parquet cache so the dashboard doesn't load outdated data
+        if os.path.exists("runners.parquet"):
+            os.remove("runners.parquet")
+        return
+
     # Scrape the data
     df = scrape_runners_data(years)
 
     # Clean the data
     df_cleaned = clean_runners_data(df)
 
-    # Save to CSV and SQLite database
+    # Save to CSV, SQLite database and Parquet
     save_to_csv(df_cleaned, "results.csv")
     save_to_sqlite(df_cleaned, "runners_db.db", "runners")
+    save_to_parquet(df_cleaned, "runners.parquet")
 
 
 if __name__ == "__main__":